@@ -8,8 +8,15 @@ les taupes", dans le cas où l'objectif est :
 
 import os
 import itertools
+import functools
 import numpy as np
 import pulp
+from collections import namedtuple
+
+# Modèle du problème pour un jardin vide (cf. `template`) :
+ModelTemplate = namedtuple('ModelTemplate', ('keys', 'windows', 'dims',
+                                             'cells', 'objective',
+                                             'constraints', 'traps'))
 
 def _dimcheck(grid, threshold):
     """
@@ -97,7 +104,203 @@ def score(grid, threshold):
     else:
         return np.inf
 
-def generate(shape, npoints):
+def _batchadmissible(grids, threshold):
+    """
+    Version vectorisée de `admissible` : indique, pour chaque grille du lot
+    `grids` (la première dimension indexe les grilles), si elle est
+    admissible.
+
+    Paramètres :
+    ------------
+    - grids : tableau numpy
+        Tableau contenant des 0 (espace libre) et des 1 (espace occupé), dont
+        la première dimension indexe les grilles.
+    - threshold : entier positif
+        Nombre d'espaces libres adjacents à partir duquel une grille est
+        considérée comme non admissible.
+
+    Exemples :
+    ----------
+    >>> grids = np.array([[[0, 1], [1, 0]], [[0, 0], [1, 0]]])
+    >>> _batchadmissible(grids, 2)
+    array([ True, False])
+    """
+    if threshold < 0:
+        raise ValueError("threshold must be positive.")
+    comp = np.where(grids, 0, 1) # On travaille sur le complémentaire.
+    res = np.ones(grids.shape[0], dtype=bool)
+    for axis in range(1, comp.ndim):
+        dsize = comp.shape[axis]
+        if threshold > dsize:
+            continue
+        # On place la dimension étudiée en dernier (cf. `_dimcheck`) :
+        dimcomp = np.moveaxis(comp, axis, -1)
+        # Avec `threshold == 0`, `check` reste nul et aucune grille n'est
+        # admissible, comme dans `_dimcheck` :
+        check = np.zeros(dimcomp.shape[:-1] + (dsize - threshold + 1,), int)
+        for start in range(threshold):
+            check += dimcomp[..., start:(dsize - threshold + 1 + start)]
+        check = (check >= threshold).reshape(grids.shape[0], -1)
+        res &= ~check.any(axis=1)
+    return res
+
+def _canonical(grids):
+    """
+    Renvoie, pour chaque grille du lot `grids` (la première dimension indexe
+    les grilles), la forme canonique aplatie de sa classe de symétrie : parmi
+    toutes les grilles obtenues par retournement d'axes et par permutation
+    d'axes de même taille, la plus petite dans l'ordre lexicographique.
+
+    Exemples :
+    ----------
+    >>> grids = np.array([[[1, 0], [0, 0]], [[0, 0], [0, 1]]])
+    >>> _canonical(grids)
+    array([[0, 0, 0, 1],
+           [0, 0, 0, 1]], dtype=uint8)
+    """
+    grids = np.asarray(grids, dtype=np.uint8)
+    n, shape = grids.shape[0], grids.shape[1:]
+    axes = range(1, grids.ndim)
+    best = None
+    for perm in itertools.permutations(axes):
+        # Seules les permutations conservant la forme sont des symétries :
+        if tuple(grids.shape[i] for i in perm) != shape:
+            continue
+        permuted = grids.transpose(0, *perm)
+        for flips in itertools.product((False, True), repeat=len(shape)):
+            flipaxes = tuple(i + 1 for i, flip in enumerate(flips) if flip)
+            variant = np.flip(permuted, flipaxes).reshape(n, -1)
+            if best is None:
+                best = variant.copy()
+                continue
+            # Comparaison lexicographique, ligne par ligne, sur le premier
+            # élément qui diffère :
+            diff = variant != best
+            first = diff.argmax(axis=1)
+            rows = np.arange(n)
+            smaller = diff.any(axis=1) & \
+                      (variant[rows, first] < best[rows, first])
+            best[smaller] = variant[smaller]
+    return best
+
+def generate_batch(shape, npoints, n, rng=None, threshold=None, unique=False,
+                   p=None, seen=None, maxiter=100, maxdraws=10**6):
+    """
+    Génère `n` grilles ayant la forme `shape`, en un seul appel vectorisé.
+    Renvoie un tableau numpy de dimensions `(n,) + shape`.
+
+    Paramètres :
+    ------------
+    - shape : entier positif, tuple d'entiers positifs
+        Dimensions des grilles.
+    - npoints : entier positif, itérable d'entiers positifs
+        Nombre de pièges imposés à placer aléatoirement dans chaque grille. Si
+        un itérable est fourni, le nombre de pièges de chaque grille est tiré
+        parmi ses valeurs, selon les probabilités `p`.
+    - n : entier positif
+        Nombre de grilles à générer.
+    - rng : None, entier, np.random.Generator, None par défaut
+        Générateur aléatoire (ou graine permettant d'en créer un). L'état
+        global de `np.random` (`np.random.seed`) n'est pas utilisé.
+    - threshold : entier positif, None par défaut
+        Si `threshold` est fourni, les grilles déjà admissibles pour ce seuil
+        (donc sans intérêt pour le solveur) sont rejetées.
+    - unique : booléen, False par défaut
+        Si `unique` vaut `True`, les grilles équivalentes à une grille déjà
+        générée (à une symétrie près) sont rejetées.
+    - p : itérable de flottants, None par défaut
+        Probabilités associées aux valeurs de `npoints` (uniformes si `p` vaut
+        `None`). Ignoré si `npoints` est un entier.
+    - seen : ensemble, None par défaut
+        Formes canoniques des grilles déjà générées (cf. `unique`). L'ensemble
+        est complété par la fonction, ce qui permet de le partager entre
+        plusieurs appels.
+    - maxiter : entier positif, 100 par défaut
+        Nombre maximal de tirages successifs pour compléter le lot lorsque des
+        grilles sont rejetées.
+    - maxdraws : entier positif, 10**6 par défaut
+        Nombre maximal de grilles tirées (acceptées ou rejetées).
+
+    Remarque : lorsque des grilles sont rejetées, chaque tirage est
+    surdimensionné d'après le taux d'acceptation observé jusque-là.
+
+    Exemples :
+    ----------
+    >>> grids = generate_batch((3, 4), 5, 10, rng=0)
+    >>> grids.shape
+    (10, 3, 4)
+    >>> grids.sum(axis=(1, 2))
+    array([5, 5, 5, 5, 5, 5, 5, 5, 5, 5])
+    """
+    shape = tuple(int(i) for i in np.atleast_1d(shape))
+    size = int(np.prod(shape))
+    if min(shape) <= 0:
+        raise ValueError("the shape %s should contain positive values only."\
+                         % str(shape))
+    values = np.atleast_1d(npoints)
+    if np.any(values != np.floor(values)):
+        raise ValueError("npoints should contain integers only.")
+    values = values.astype(int)
+    if np.any(values < 0) or np.any(values > size):
+        raise ValueError("npoints should be between 0 and %d." % size)
+    if threshold is not None and threshold > max(shape):
+        raise ValueError("threshold %d exceeds the shape %s: no grid can be "\
+                         "non-admissible." % (threshold, str(shape)))
+    # Il faut au moins `threshold` cases libres pour qu'une taupe entre :
+    if threshold is not None and values.min() > size - threshold:
+        raise ValueError("with %d points or more in a grid of shape %s, no "\
+                         "grid can be non-admissible." % (values.min(),
+                                                          str(shape)))
+    rng = np.random.default_rng(rng)
+    reject = (threshold is not None) or unique
+    if seen is None:
+        seen = set()
+    res = [np.zeros((0,) + shape, dtype=int)]
+    remaining = n
+    drawn = accepted = 0
+    for _ in range(maxiter):
+        if remaining <= 0 or drawn >= maxdraws:
+            break
+        # Taille du tirage, d'après le taux d'acceptation observé :
+        ndraws = remaining
+        if reject:
+            rate = (accepted + 1.) / (drawn + 1.)
+            ndraws = max(64, int(np.ceil(1.2 * remaining / rate)))
+        ndraws = min(ndraws, maxdraws - drawn, max(1, 2**22 // size))
+        drawn += ndraws
+        # Nombre de pièges de chaque grille :
+        if np.ndim(npoints) == 0:
+            counts = np.full(ndraws, values[0])
+        else:
+            counts = rng.choice(values, ndraws, p=p)
+        # Les `counts[k]` premières cases d'une permutation aléatoire de la
+        # grille `k` reçoivent un piège :
+        perm = rng.permuted(np.tile(np.arange(size), (ndraws, 1)), axis=1)
+        mask = np.arange(size) < counts[:, None]
+        grids = np.zeros((ndraws, size), dtype=int)
+        grids[np.nonzero(mask)[0], perm[mask]] = 1
+        grids = grids.reshape((ndraws,) + shape)
+        # Rejet des grilles sans intérêt :
+        if threshold is not None:
+            grids = grids[~_batchadmissible(grids, threshold)]
+        if unique and len(grids):
+            canon = _canonical(grids)
+            _, first = np.unique(canon, axis=0, return_index=True)
+            keep = [k for k in sorted(first) if canon[k].tobytes() not in seen]
+            grids = grids[keep]
+        accepted += len(grids)
+        # On ne conserve que les premières grilles acceptées :
+        grids = grids[:remaining]
+        if unique:
+            seen.update(canon[k].tobytes() for k in keep[:remaining])
+        res.append(grids)
+        remaining -= len(grids)
+    if remaining > 0:
+        raise ValueError("failed to generate %d of %d grids (%d draws in "\
+                         "%d iterations)." % (remaining, n, drawn, maxiter))
+    return np.concatenate(res)
+
+def generate(shape, npoints, rng=None):
     """
     Génère une grille ayant la forme `shape` et contenant `npoints` pièges.
 
@@ -107,15 +310,14 @@ def generate(shape, npoints):
         Dimensions de la grille.
     - npoints : entier positif
         Nombre de pièges imposés à placer aléatoirement dans la grille.
+    - rng : None, entier, np.random.Generator, None par défaut
+        Générateur aléatoire (ou graine permettant d'en créer un).
+
+    Remarque : la fonction n'utilise plus l'état global de `np.random` ;
+    `np.random.seed` n'a donc plus d'effet sur les grilles générées. Pour des
+    résultats reproductibles, il faut fournir `rng`.
     """
-    size = np.product(shape)
-    if size <= 0:
-        raise ValueError("the shape %s should contain positive values only."\
-                         % str(shape))
-    points = np.random.choice(np.arange(size), npoints, replace=False)
-    grid = np.zeros(size, dtype=np.int)
-    grid[points] = 1
-    return grid.reshape(shape)
+    return generate_batch(shape, npoints, 1, rng)[0]
 
 def _key(indexes, fromstr=False):
     """
@@ -129,40 +331,104 @@ def _key(indexes, fromstr=False):
     else:
         return sep.join((str(idx) for idx in indexes))
 
-def _slice(index, i, nneighbors, lim):
+@functools.lru_cache(maxsize=32)
+def _template(shape, threshold):
+    "Version mise en cache de `template` (`shape` doit être un tuple)."
+    size = int(np.prod(shape))
+    flat = np.arange(size).reshape(shape)
+    keys = tuple(_key(index) for index in np.ndindex(*shape))
+    windows, dims = [], []
+    for i, dsize in enumerate(shape): # Itération sur toutes les dimensions.
+        if threshold > dsize:
+            continue
+        # Fenêtre j : cases j, ..., j + threshold - 1 dans la dimension i.
+        window = np.stack([flat.take(range(j, dsize - threshold + 1 + j), i)
+                           for j in range(threshold)], axis=-1)
+        windows.append(window.reshape(-1, threshold))
+        dims.append(np.full(len(windows[-1]), i))
+    windows = np.concatenate(windows or [np.zeros((0, threshold), int)])
+    dims = np.concatenate(dims or [np.zeros(0, int)])
+    # Même ordre que l'énumération case par case, puis dimension par dimension:
+    order = np.lexsort((dims, windows[:, 0]))
+    windows, dims = windows[order], dims[order]
+    # Le modèle est partagé entre les instances : on le protège en écriture.
+    windows.flags.writeable = False
+    dims.flags.writeable = False
+    # Variables, fonction objectif et contraintes du jardin vide :
+    cells = pulp.LpVariable.dicts("Cells", list(keys), 0, 1, "Integer")
+    cells = tuple(cells[key] for key in keys)
+    objective = pulp.lpSum(cells)
+    objective.name = "Non empty points"
+    constraints = []
+    for window, i in zip(windows, dims):
+        constraint = pulp.lpSum([cells[j] for j in window]) >= 1
+        constraint.name = "Cell_%s_dim_%d" % (keys[window[0]], i)
+        constraints.append(constraint)
+    # Contraintes fixant les pièges imposés :
+    traps = []
+    for key, cell in zip(keys, cells):
+        constraint = cell >= 1
+        constraint.name = "Trap_%s" % key
+        traps.append(constraint)
+    return ModelTemplate(keys, windows, dims, cells, objective,
+                         tuple(constraints), tuple(traps))
+
+def template(shape, threshold):
     """
-    A partir de l'indice `index`, renvoie les `nneighbors` indices suivants
-    dans la dimension `i` (y compris `index`, qui est le premier élément de
-    la liste).
+    Renvoie le modèle du problème "Le jardinier et les taupes" pour un jardin
+    vide de forme `shape` et des taupes de taille `threshold` :
+    - keys : tuple de chaînes de caractères
+        Nom de chaque case, dans l'ordre de la grille aplatie.
+    - windows : tableau numpy de dimensions (nwindows, threshold)
+        Indices (dans la grille aplatie) des cases de chaque fenêtre que peut
+        occuper une taupe ; chaque fenêtre donne une contrainte.
+    - dims : tableau numpy de dimensions (nwindows,)
+        Dimension dans laquelle s'étend chaque fenêtre.
+    - cells : tuple de pulp.LpVariable
+        Variable associée à chaque case.
+    - objective : pulp.LpAffineExpression
+        Nombre total de pièges.
+    - constraints : tuple de pulp.LpConstraint
+        Contrainte associée à chaque fenêtre.
+    - traps : tuple de pulp.LpConstraint
+        Contrainte fixant un piège imposé, pour chaque case.
 
-    Si certains des indices calculés sont supérieurs à `lim` dans la dimension
-    `i`, renvoie une liste vide.
+    Les modèles sont mis en cache (LRU) par couple (`shape`, `threshold`) : une
+    instance n'a plus qu'à écarter les contraintes des fenêtres couvertes par
+    ses pièges imposés et à fixer ces derniers. Le cache est propre à chaque
+    processus : des processus lancés par fork héritent des modèles construits
+    avant leur lancement, les autres reconstruisent les leurs au premier
+    appel.
 
     Paramètres :
     ------------
-    - index : tuple d'indices
-    - i : entier
-        Dimension à considérer.
-    - nneighbors : entier positif
-        Nombre d'indices à considérer dans la dimension `i` à partir de
-        l'indice `index`.
-    - lim : entier positif
-        Indice maximal dans la dimension `i`.
+    - shape : entier positif, tuple d'entiers positifs
+        Dimensions de la grille.
+    - threshold : entier positif
+        Taille des taupes.
 
     Exemples :
     ----------
-    >>> index = (1, 2, 3)
-    >>> _slice(index, i=0, nneighbors=4, lim=4)
-    [(1, 2, 3), (2, 2, 3), (3, 2, 3), (4, 2, 3)]
-    >>> _slice(index, i=0, nneighbors=4, lim=3)
-    []
-    >>> _slice(index, i=1, nneighbors=2, lim=10)
-    [(1, 2, 3), (1, 3, 3)]
-    """
-    rng = range(nneighbors)
-    if index[i] + rng[-1] > lim:
-        return []
-    return [index[:i] + (index[i] + j,) + index[(i+1):] for j in rng]
+    >>> tpl = template((2, 3), 2)
+    >>> tpl.keys
+    ('0_0', '0_1', '0_2', '1_0', '1_1', '1_2')
+    >>> tpl.windows
+    array([[0, 3],
+           [0, 1],
+           [1, 4],
+           [1, 2],
+           [2, 5],
+           [3, 4],
+           [4, 5]])
+    >>> tpl.dims
+    array([0, 1, 0, 1, 0, 1, 1])
+    >>> tpl.constraints[0].name
+    'Cell_0_0_dim_0'
+    """
+    if threshold < 1:
+        raise ValueError("threshold must be positive.")
+    return _template(tuple(int(i) for i in np.atleast_1d(shape)),
+                     int(threshold))
 
 def solve(grid, threshold, name, compdir=None):
     """
@@ -182,37 +448,30 @@ def solve(grid, threshold, name, compdir=None):
         Dossier dans lequel effectuer les calculs (il s'agit du répertoire
         courant si `compdir` vaut `None`).
 
-    Remarque : le nom de l'instance est utilisée comme nom pour le fichier
-    d'instruction du solveur. Si la fonction doit être exécutée plusieurs
-    fois en parallèle, il est nécessaire que `name` soit unique.
+    Remarques :
+    - le nom de l'instance est utilisée comme nom pour le fichier
+      d'instruction du solveur. Si la fonction doit être exécutée plusieurs
+      fois en parallèle, il est nécessaire que `name` soit unique ;
+    - les variables du modèle sont partagées entre les instances de même
+      forme et de même seuil (cf. `template`) : la fonction peut être
+      exécutée en parallèle dans plusieurs processus, mais pas dans plusieurs
+      threads.
     """
+    # Modèle du problème pour un jardin vide (mis en cache) :
+    tpl = template(grid.shape, threshold)
+    flat = grid.ravel()
+    free = np.flatnonzero(flat == 0)
     # Initialisation du problème :
     prob = pulp.LpProblem(name, pulp.LpMinimize)
-    # Déclaration des variables :
-    varnames = []
-    for index in itertools.product(*(range(size) for size in grid.shape)):
-        if grid[index] == 0:
-            varnames.append(_key(index))
-    varprefix = "Cells"
-    cells = pulp.LpVariable.dicts(varprefix, varnames, 0, 1, 'Integer')
-    # Déclaration de la fonction objectif :
-    prob += pulp.lpSum([cells[idx] for idx in varnames]), "Non empty points"
-    # Déclaration des variables et des contraintes :
-    # TODO : sans faire compliqué, il y a des leviers d'amélioration :
-    # - dans la boucle, il n'est pas nécessaire d'itérer jusqu'à `size` ;
-    # - on peut éliminer à l'avance certaines variables (à moins que PuLP
-    #   ne le fasse déjà).
-    it = itertools.product(*(range(size) for size in grid.shape))
-    it = filter(lambda x: grid[x] == 0, it)
-    for index in it:
-        for i in range(len(index)): # Itération sur toutes les dimensions.
-            neighbors = _slice(index, i, threshold, grid.shape[i] - 1)
-            # Si on est proche de l'extrémité de la grille (`neighbors` est
-            # vide) ou s'il y a un piège proche dans toutes les directions,
-            # inutile d'aller plus loin :
-            if neighbors and all([_key(j) in varnames for j in neighbors]):
-                prob += pulp.lpSum([cells[_key(j)] for j in neighbors]) >= 1,\
-                        "Cell_%s_dim_%d" % (_key(index), i)
+    prob += tpl.objective
+    # Les fenêtres contenant un piège imposé sont déjà bloquées, inutile de
+    # conserver leurs contraintes :
+    keep = ~flat[tpl.windows].any(axis=1)
+    for k in np.flatnonzero(keep):
+        prob.addConstraint(tpl.constraints[k])
+    # Les pièges imposés sont fixés :
+    for k in np.flatnonzero(flat):
+        prob.addConstraint(tpl.traps[k])
     # Résolution du problème:
     fname = "%s.lp" % name
     if compdir is not None:
@@ -228,9 +487,5 @@ def solve(grid, threshold, name, compdir=None):
         raise ValueError("optimization %s did not converge." % name)
     # Mise en forme du résultat :
     res = grid.copy()
-    for cell in prob.variables():
-        # PuLP renomme les variables de manière assez malcommode :
-        name = cell.name.replace(varprefix + '_', '')
-        if name in varnames:
-            res[_key(name, fromstr=True)] = cell.varValue
+    res.flat[free] = [tpl.cells[k].varValue for k in free]
     return res
@@ -6,6 +6,7 @@ la résolution du problème "Le jardinier et les taupes".
 
 import os
 import time
+import warnings
 import itertools
 import numpy as np
 from uuid import uuid4
@@ -13,6 +14,9 @@ from collections import namedtuple
 
 InstanceParams = namedtuple('InstanceParams', ('shape', 'npoints', 'threshold'))
 
+# Nombre maximal de paramètres consécutifs ignorés par `makeseveral` :
+_MAXSKIP = 10
+
 def _argsort(it, **kwargs):
     """
     Renvoie une version triée de l'itérable `it`, ainsi que les indices
@@ -99,12 +103,28 @@ def load(fname):
     data = np.load(fname)
     return data["grid"], data["solution"]
 
-def makeone(pb, params, where, compdir=None):
+def _solveandsave(pb, params, grid, where, compdir=None):
+    """
+    Résout l'instance `grid`, générée pour les paramètres `params`, puis
+    sauvegarde la grille et sa solution (cf. `makeone`). Renvoie le nom du
+    fichier où est enregistré la donnée.
+    """
+    # Création d'un nom unique :
+    name = str(uuid4())
+    # Résolution de l'instance :
+    solution = pb.solve(grid, params.threshold, name, compdir)
+    # Sauvegarde :
+    if pb.admissible(solution, params.threshold):
+        return _save(name, params, grid, solution, where)
+    else:
+        raise ValueError("failed to solve %s." % name)
+
+def makeone(pb, params, where, compdir=None, rng=None):
     """
     Crée une donnée pour l'apprentissage du problème "Le jardinier et les
     taupes" :
-        1. Génère une instance du problème dans la version du module `pb`,
-           pour les paramètres `params`.
+        1. Génère une instance non admissible du problème dans la version du
+           module `pb`, pour les paramètres `params`.
         2. Résout cette instance.
         3. Sauvegarde la grille et sa solution.
     Renvoie le nom du fichier où est enregistré la donnée.
@@ -120,28 +140,25 @@ def makeone(pb, params, where, compdir=None):
     - compdir : chaîne de caractères, None par défaut
         Dossier dans lequel effectuer les calculs (il s'agit du répertoire
         courant si `compdir` vaut `None`).
+    - rng : None, entier, np.random.Generator, None par défaut
+        Générateur aléatoire (ou graine permettant d'en créer un).
+
+    Remarque : les grilles déjà admissibles sont rejetées dès leur génération
+    (elles n'apportent rien à l'apprentissage) ; une exception est levée si
+    `params` ne permet pas d'en générer d'autres (par exemple si la grille est
+    entièrement remplie de pièges).
     """
-    # Création d'un nom unique :
-    name = str(uuid4())
-    # Génération de l'instance :
-    grid = pb.generate(params.shape, params.npoints)
-    # Résolution de l'instance :
-    if pb.admissible(grid, params.threshold):
-        solution = grid
-    else:
-        solution = pb.solve(grid, params.threshold, name, compdir)
-    # Sauvegarde :
-    if pb.admissible(solution, params.threshold):
-        return _save(name, params, grid, solution, where)
-    else:
-        raise ValueError("failed to solve %s." % name)
+    grid = pb.generate_batch(params.shape, params.npoints, 1, rng,
+                             threshold=params.threshold)[0]
+    return _solveandsave(pb, params, grid, where, compdir)
 
-def makeseveral(pb, params, where, nsamples=None, maxtime=None, compdir=None):
+def makeseveral(pb, params, where, nsamples=None, maxtime=None, compdir=None,
+                rng=None, batchsize=100, unique=False, p=None):
     """
     Crée plusieurs données pour l'apprentissage du problème "Le jardinier et les
     taupes" :
-        1. Génère des instances du problème dans la version du module `pb`,
-           pour les paramètres `params`.
+        1. Génère, par lots, des instances non admissibles du problème dans la
+           version du module `pb`, pour les paramètres `params`.
         2. Résout ces instances.
         3. Sauvegarde les grilles et leurs solutions.
     Renvoie la liste des noms des fichiers où sont enregistrés les données (un
@@ -152,8 +169,10 @@ def makeseveral(pb, params, where, nsamples=None, maxtime=None, compdir=None):
     - pb
         Objet permettant de générer et de résoudre des instances du problème.
     - params : InstanceParams, itérable d'InstanceParams
-        Paramètres de l'instance à générer. Si un itérable est fourni, la
-        fonction le transforme en cycle, afin de pouvoir indéfiniment dessus.
+        Paramètres des instances à générer. Si un itérable est fourni, la
+        fonction le transforme en cycle, afin de pouvoir indéfiniment dessus ;
+        chaque élément sert à générer un lot d'instances. Le champ `npoints`
+        peut être un itérable (cf. `p`).
     - where : chaîne de caractères
         Dossier dédié au stockage des données pour le problème `pb`.
     - nsamples : entier positif, None par défaut
@@ -169,30 +188,72 @@ def makeseveral(pb, params, where, nsamples=None, maxtime=None, compdir=None):
     - compdir : chaîne de caractères, None par défaut
         Dossier dans lequel effectuer les calculs (il s'agit du répertoire
         courant si `compdir` vaut `None`).
+    - rng : None, entier, np.random.Generator, None par défaut
+        Générateur aléatoire (ou graine permettant d'en créer un), partagé par
+        toutes les instances.
+    - batchsize : entier positif, 100 par défaut
+        Nombre d'instances générées en une fois pour un même élément de
+        `params`.
+    - unique : booléen, False par défaut
+        Si `unique` vaut `True`, les instances équivalentes (à une symétrie
+        près) à une instance déjà générée avec la même forme et le même seuil
+        sont rejetées, sur l'ensemble des données.
+    - p : itérable de flottants, None par défaut
+        Probabilités associées aux valeurs de `params.npoints`, lorsque ce
+        champ est un itérable (uniformes si `p` vaut `None`).
 
-    Remarque : si `nsamples` et `maxtime` sont tous les deux fixés à `None`, la
-    fonction fonctionnera indéfiniment, ou jusqu'à ce qu'elle soit manuellement
-    arrêtée par l'utilisateur.
+    Remarques :
+    - si `nsamples` et `maxtime` sont tous les deux fixés à `None`, la
+      fonction fonctionnera indéfiniment, ou jusqu'à ce qu'elle soit
+      manuellement arrêtée par l'utilisateur ;
+    - si un élément de `params` ne permet pas de générer d'instance non
+      admissible, il est ignoré (avec un avertissement) ; une exception est
+      levée au-delà de `_MAXSKIP` éléments ignorés consécutivement.
     """
     # Modification des paramètres en un format commode :
     if nsamples is None:
         nsamples = np.inf
     if maxtime is None:
         maxtime = np.inf
+    rng = np.random.default_rng(rng)
     if isinstance(params, InstanceParams):
         paramsit = itertools.repeat(params)
     else:
         paramsit = itertools.cycle(params)
     # Initalisation :
     res = []
+    seen = {} # Formes canoniques déjà générées, par forme et par seuil.
+    skipped = 0
     counter = 0
     elapsed = 0.0
     start = time.time()
     # Itération :
     while (counter < nsamples) and (elapsed < maxtime):
-        res.append(makeone(pb, next(paramsit), where, compdir))
-        if nsamples != np.inf:
-            counter += 1
-        if maxtime != np.inf:
-            elapsed = time.time() - start
+        prm = next(paramsit)
+        # Génération d'un lot d'instances non admissibles :
+        nbatch = int(min(batchsize, nsamples - counter))
+        key = (tuple(np.atleast_1d(prm.shape)), prm.threshold)
+        try:
+            grids = pb.generate_batch(prm.shape, prm.npoints, nbatch, rng,
+                                      threshold=prm.threshold, unique=unique,
+                                      p=p, seen=seen.setdefault(key, set()))
+        except ValueError as err:
+            skipped += 1
+            if skipped >= _MAXSKIP:
+                raise ValueError("%d consecutive parameters skipped, last: "\
+                                 "%s." % (skipped, err))
+            warnings.warn("skipping %s: %s" % (str(prm), err))
+            if maxtime != np.inf:
+                elapsed = time.time() - start
+            continue
+        skipped = 0
+        # Résolution et sauvegarde :
+        for grid in grids:
+            if (counter >= nsamples) or (elapsed >= maxtime):
+                break
+            res.append(_solveandsave(pb, prm, grid, where, compdir))
+            if nsamples != np.inf:
+                counter += 1
+            if maxtime != np.inf:
+                elapsed = time.time() - start
     return res
@@ -31,10 +31,10 @@ def test_admissible():
     got = bc.admissible(grid, threshold=4)
     assert (got is False)
     # Plus de 2 dimensions :
-    grid = np.ones(24, dtype=np.int).reshape((4, 3, 2))
+    grid = np.ones(24, dtype=int).reshape((4, 3, 2))
     got = bc.admissible(grid, threshold=1)
     assert (got is True)
-    grid = np.ones(24, dtype=np.int).reshape((4, 3, 2))
+    grid = np.ones(24, dtype=int).reshape((4, 3, 2))
     grid[1, :, 1] = 0
     got = bc.admissible(grid, threshold=3)
     assert (got is False)
@@ -60,10 +60,10 @@ def test_score():
     got = bc.score(grid, threshold=5)
     assert (got == 0)
     # Plus de 2 dimensions :
-    grid = np.ones(24, dtype=np.int).reshape((4, 3, 2))
+    grid = np.ones(24, dtype=int).reshape((4, 3, 2))
     got = bc.score(grid, threshold=1)
     assert (got == 24)
-    grid = np.ones(24, dtype=np.int).reshape((4, 3, 2))
+    grid = np.ones(24, dtype=int).reshape((4, 3, 2))
     grid[1, :, 1] = 0
     got = bc.score(grid, threshold=3)
     assert (got == np.inf)
@@ -71,11 +71,11 @@ def test_score():
 def test_generate():
     "Teste la fonction `generate` du module basecase."
     # Sans pièges imposés :
-    expected = np.zeros((2, 3), dtype=np.int)
+    expected = np.zeros((2, 3), dtype=int)
     got = bc.generate((2, 3), npoints=0)
     assert np.all(got == expected)
     # Avec autant de pièges imposés que de cases :
-    expected = np.ones((2, 3), dtype=np.int)
+    expected = np.ones((2, 3), dtype=int)
     got = bc.generate((2, 3), npoints=6)
     assert np.all(got == expected)
     # Nombre de pièges :
@@ -84,6 +84,94 @@ def test_generate():
     # Levée d'exception :
     with pytest.raises(ValueError):
         bc.generate((10, 0, 3), npoints=0)
+    # Reproductibilité :
+    got = bc.generate((10, 5), npoints=20, rng=42)
+    expected = bc.generate((10, 5), npoints=20, rng=42)
+    assert np.all(got == expected)
+
+def test_batchadmissible():
+    "Teste la fonction `_batchadmissible` du module basecase."
+    # Comparaison avec `admissible`, y compris pour des seuils extrêmes :
+    rng = np.random.default_rng(0)
+    for shape in [(7,), (4, 3), (3, 2, 4)]:
+        grids = rng.integers(0, 2, size=(30,) + shape)
+        for threshold in range(max(shape) + 2):
+            got = bc._batchadmissible(grids, threshold)
+            expected = [bc.admissible(grid, threshold) for grid in grids]
+            assert np.all(got == expected)
+
+def test_generate_batch():
+    "Teste la fonction `generate_batch` du module basecase."
+    # Dimensions et nombre de pièges :
+    got = bc.generate_batch((4, 3), npoints=5, n=50, rng=0)
+    assert (got.shape == (50, 4, 3))
+    assert np.all(got.sum(axis=(1, 2)) == 5)
+    # Reproductibilité :
+    expected = bc.generate_batch((4, 3), npoints=5, n=50, rng=0)
+    assert np.all(got == expected)
+    # Nombre de pièges tiré selon une distribution :
+    got = bc.generate_batch((4, 3), npoints=[2, 7], n=200, rng=0, p=[0.5, 0.5])
+    counts = got.sum(axis=(1, 2))
+    assert set(counts) == {2, 7}
+    # Rejet des grilles déjà admissibles :
+    threshold = 3
+    got = bc.generate_batch((5, 5), npoints=6, n=50, rng=0,
+                            threshold=threshold)
+    assert (len(got) == 50)
+    assert not any(bc.admissible(grid, threshold) for grid in got)
+    # Rejet des grilles équivalentes à une symétrie près : il n'existe que
+    # 2 classes de grilles 2x2 contenant 2 pièges (adjacents ou en diagonale).
+    got = bc.generate_batch((2, 2), npoints=2, n=2, rng=0, unique=True)
+    canon = {bc._canonical(grid[None])[0].tobytes() for grid in got}
+    assert (len(canon) == 2)
+    # Ensemble `seen` partagé entre plusieurs appels :
+    seen = set()
+    bc.generate_batch((2, 2), npoints=2, n=1, rng=0, unique=True, seen=seen)
+    bc.generate_batch((2, 2), npoints=2, n=1, rng=0, unique=True, seen=seen)
+    assert (len(seen) == 2)
+    # Taux d'acceptation faible (environ 1 %), même pour une seule grille :
+    for seed in range(10):
+        got = bc.generate_batch((5, 5), npoints=22, n=1, rng=seed,
+                                threshold=threshold)
+        assert not bc.admissible(got[0], threshold)
+    got = bc.generate_batch((5, 5), npoints=22, n=50, rng=0,
+                            threshold=threshold)
+    assert (len(got) == 50)
+    # Levée d'exception :
+    with pytest.raises(ValueError):
+        bc.generate_batch((2, 2), npoints=5, n=1)
+    with pytest.raises(ValueError):
+        bc.generate_batch((3, 3), npoints=2.5, n=4)
+    with pytest.raises(ValueError):
+        bc.generate_batch((3, 3), npoints=[2, 2.5], n=4)
+    with pytest.raises(ValueError, match="non-admissible"):
+        bc.generate_batch((3, 2), npoints=2, n=4, threshold=4)
+    with pytest.raises(ValueError, match="non-admissible"):
+        bc.generate_batch((3, 3), npoints=[7, 9], n=4, threshold=3)
+    with pytest.raises(ValueError, match="failed to generate"):
+        bc.generate_batch((5, 5), npoints=22, n=50, rng=0, threshold=3,
+                          maxdraws=100)
+    with pytest.raises(ValueError, match="failed to generate 1 of 3 grids"):
+        bc.generate_batch((2, 2), npoints=2, n=3, rng=0, unique=True,
+                          maxiter=10)
+
+def test_template():
+    "Teste la fonction `template` du module basecase."
+    # Nombre de fenêtres : (5 - 3 + 1) * 4 + (4 - 3 + 1) * 5 :
+    tpl = bc.template((5, 4), 3)
+    assert (tpl.windows.shape == (22, 3))
+    assert (len(tpl.keys) == 20)
+    assert (len(tpl.constraints) == 22)
+    assert (len(tpl.traps) == 20)
+    # Mise en cache :
+    assert (bc.template((5, 4), 3) is tpl)
+    assert (bc.template((4, 5), 3) is not tpl)
+    # Seuil > taille :
+    tpl = bc.template((2, 2), 3)
+    assert (len(tpl.windows) == 0)
+    # Levée d'exception :
+    with pytest.raises(ValueError):
+        bc.template((2, 2), 0)
 
 def test_solve():
     "Teste la fonction `solve` du module basecase."
@@ -6,7 +6,9 @@ Teste les fonctions du module basecase.
 import time
 import shutil
 import tempfile
+import pytest
 import numpy as np
+from mole import basecase as bc
 from mole import makedata as mk
 
 class TemporaryDirectory(object):
@@ -39,10 +41,14 @@ class MockPb():
         self._solution = np.random.randint(low=0, high=2, size=shape)
         while np.all(self._grid == self._solution):
             self._solution = np.random.randint(low=0, high=2, size=shape)
+        self.batches = []
 
-    def generate(self, shape, npoints):
-        "Renvoie une fausse instance."
-        return self._grid.copy()
+    def generate_batch(self, shape, npoints, n, rng=None, threshold=None,
+                       unique=False, p=None, seen=None):
+        "Renvoie `n` copies d'une fausse instance."
+        self.rejected = threshold
+        self.batches.append(n)
+        return np.array([self._grid] * n)
 
     def admissible(self, grid, threshold):
         "Indique si `grid` est une solution."
@@ -55,7 +61,7 @@ class MockPb():
 def genparams(shape, threshold):
     "Fonction créant un générateur de paramètres aléatoires."
     while True:
-        npoints = np.random.binomial(np.product(shape), 0.5)
+        npoints = np.random.binomial(np.prod(shape), 0.5)
         yield mk.InstanceParams(shape, npoints, threshold)
 
 def test_makeone():
@@ -65,6 +71,7 @@ def test_makeone():
     with TemporaryDirectory() as tmpdir:
         # Création d'une donnée :
         output1 = mk.makeone(pb, params, tmpdir)
+        assert (pb.rejected == params.threshold) # Grilles admissibles rejetées.
         grid, solution = mk.load(output1)
         got = pb.admissible(grid, params.threshold)
         assert (got == False)
@@ -109,5 +116,43 @@ def test_makeseveral():
         # Utilisation de paramètres aléatoires :
         res = mk.makeseveral(pb, genparams((5, 5), 3), tmpdir, nsamples=nsamples)
         assert (len(res) == nsamples)
-
-
+        # Génération par lots :
+        pb.batches = []
+        res = mk.makeseveral(pb, params, tmpdir, nsamples=5, batchsize=2)
+        assert (len(res) == 5)
+        assert (pb.batches == [2, 2, 1])
+
+def test_makeseveral_skip():
+    "Teste que les paramètres sans instance non admissible sont ignorés."
+    threshold = 3
+    saturated = mk.InstanceParams((3, 3), 9, threshold)
+    params = [saturated, mk.InstanceParams((3, 3), 2, threshold)]
+    with TemporaryDirectory() as tmpdir:
+        # Une seule instance : levée d'exception immédiate.
+        with pytest.raises(ValueError):
+            mk.makeone(bc, saturated, tmpdir, compdir=tmpdir)
+        # Plusieurs instances : les paramètres saturés sont ignorés.
+        with pytest.warns(UserWarning):
+            res = mk.makeseveral(bc, params, tmpdir, nsamples=3,
+                                 compdir=tmpdir, rng=0, batchsize=1)
+        assert (len(res) == 3)
+        for fname in res:
+            grid, solution = mk.load(fname)
+            assert not bc.admissible(grid, threshold)
+            assert bc.admissible(solution, threshold)
+        # Paramètres tous saturés : levée d'exception.
+        with pytest.raises(ValueError):
+            with pytest.warns(UserWarning):
+                mk.makeseveral(bc, saturated, tmpdir, nsamples=1)
+
+def test_makeseveral_unique():
+    "Teste le rejet des doublons sur l'ensemble des données."
+    # Il n'existe que 2 classes de grilles 2x2 contenant 2 pièges, toutes deux
+    # non admissibles pour des taupes de taille 1 :
+    params = mk.InstanceParams((2, 2), 2, 1)
+    with TemporaryDirectory() as tmpdir:
+        res = mk.makeseveral(bc, params, tmpdir, nsamples=2, compdir=tmpdir,
+                             rng=0, batchsize=1, unique=True)
+        canon = {bc._canonical(mk.load(fname)[0][None])[0].tobytes()
+                 for fname in res}
+        assert (len(canon) == 2)